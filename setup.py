@@ -50,6 +50,7 @@ setup(
             'coverage',
             'pytest',
             'pytest-cov',
+            'pytest-xdist',
         ],
         'docs': [
             'sphinx>=2.0',
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+
+if "PYTEST_XDIST_WORKER" in os.environ:
+    # each xdist worker is its own process, so don't let them all spawn
+    # a full set of BLAS threads - must happen before numpy is imported
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("MKL_NUM_THREADS", "1")
+    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runslow", action="store_true", default=False,
+        help="run tests marked as slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "slow: mark test as slow, only run with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+
+    skip_slow = pytest.mark.skip(reason="need --runslow option to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)